@@ -5,12 +5,26 @@ This script retrieves information about AWS instances with GPUs,
 including P5e, P5, P4, P3, G3, G4, G5, G6, G6e, and G5g families.
 """
 
+import argparse
 import boto3
+from botocore.config import Config
+import functools
 import json
 import os
-from typing import Dict, List, Any, Optional
+import shutil
+import time
+from typing import Callable, Dict, List, Any, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson parses large pricing documents several times faster than json
+_jloads = orjson.loads if orjson is not None else json.loads
+
 # GPU instance families we want to track
 GPU_INSTANCE_FAMILIES = [
     "p5en",
@@ -30,6 +44,7 @@ GPU_INSTANCE_FAMILIES = [
 
 # GPU models mapping to their instance families
 GPU_MODEL_MAP = {
+    "p5en": "NVIDIA H200",
     "p5e": "NVIDIA H200",
     "p5": "NVIDIA H100",
     "p4d": "NVIDIA A100",
@@ -58,174 +73,355 @@ GPU_MEMORY_MAP = {
     "AWS Graviton2 (ARM)": 0,  # Not actually a dedicated GPU
 }
 
+# GPU model and memory size (in GB) per instance family
+FAMILY_TO_GPU = {
+    family: (model, GPU_MEMORY_MAP.get(model, 0))
+    for family, model in GPU_MODEL_MAP.items()
+}
+
+# Regions fetched when none are given on the command line
+DEFAULT_REGIONS = ["us-east-1"]
+
+# Families ordered longest first so e.g. "p4de" is not resolved as "p4d"
+FAMILIES_SORTED = tuple(sorted(GPU_INSTANCE_FAMILIES, key=len, reverse=True))
+
+# Shared botocore configuration; a generous connection pool lets concurrent
+# requests reuse keep-alive sockets
+BOTO_CFG = Config(
+    max_pool_connections=32,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True,
+)
+
+# The Pricing API is only served from a few regions; one client is shared
+# by every request
+PRICING_CLIENT = boto3.client("pricing", region_name="us-east-1", config=BOTO_CFG)
+
+# Pricing API filters selecting Linux, shared-tenancy on-demand compute SKUs
+_BASE_FILTERS = (
+    {"Type": "TERM_MATCH", "Field": "productFamily", "Value": "Compute Instance"},
+    {"Type": "TERM_MATCH", "Field": "operatingSystem", "Value": "Linux"},
+    {"Type": "TERM_MATCH", "Field": "tenancy", "Value": "Shared"},
+    {"Type": "TERM_MATCH", "Field": "capacitystatus", "Value": "Used"},
+    {"Type": "TERM_MATCH", "Field": "preInstalledSw", "Value": "NA"},
+)
+
+# On-disk cache for API responses, kept out of public/ so it is never
+# bundled with the site
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "llm_memory_calculator",
+)
+INSTANCE_TYPES_CACHE_TTL = 24 * 60 * 60  # 24 hours
+PRICING_CACHE_TTL = 6 * 60 * 60  # 6 hours
+
+# Set to False (e.g. via --no-cache) to ignore cached entries and refresh them
+USE_CACHE = True
+
+
+def cached(ttl: int, key: Union[str, Callable[..., str]]):
+    """
+    Cache a function's JSON-serializable result on disk.
+
+    Entries are stored as ``CACHE_DIR/<key>.json`` and considered fresh while
+    their modification time is within ``ttl`` seconds. Stale or missing
+    entries are recomputed and written atomically.
+
+    Args:
+        ttl: Time to live in seconds
+        key: Cache key, or a callable building one from the call arguments
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if callable(key) else key
+            cache_path = os.path.join(CACHE_DIR, f"{cache_key}.json")
+
+            if (
+                USE_CACHE
+                and os.path.exists(cache_path)
+                and time.time() - os.path.getmtime(cache_path) < ttl
+            ):
+                with open(cache_path) as f:
+                    return json.load(f)
+
+            result = func(*args, **kwargs)
+
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, cache_path)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _instance_types_cache_key(region: str = "us-east-1") -> str:
+    """Build an instance types cache key for a region."""
+    return f"ec2_instance_types_{region}"
+
+
+def _pricing_cache_key(region: str = "us-east-1") -> str:
+    """Build a pricing cache key for a region."""
+    return f"pricing_{region}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _family_for(instance_type: str) -> str:
+    """
+    Resolve the GPU instance family of an instance type name.
+
+    Args:
+        instance_type: Instance type name, e.g. "p4de.24xlarge"
+
+    Returns:
+        str: The matching family, or "unknown"
+    """
+    return next(
+        (
+            f
+            for f in FAMILIES_SORTED
+            if instance_type.startswith(f + ".") or instance_type == f
+        ),
+        "unknown",
+    )
+
 
-def get_instance_types() -> List[Dict[str, Any]]:
+@cached(ttl=INSTANCE_TYPES_CACHE_TTL, key=_instance_types_cache_key)
+def get_instance_types(region: str = "us-east-1") -> List[Dict[str, Any]]:
     """
     Get information about all instance types.
 
+    Args:
+        region: AWS region to list instance types for
+
     Returns:
         List[Dict[str, Any]]: List of instance data dictionaries
     """
-    ec2 = boto3.client("ec2", region_name="us-east-1")
+    # The default boto3 session is not thread-safe, so regions fetched
+    # concurrently each build their client from their own session
+    session = boto3.session.Session()
+    ec2 = session.client("ec2", region_name=region, config=BOTO_CFG)
 
     # Get all instance types
     instance_types = []
     paginator = ec2.get_paginator("describe_instance_types")
 
-    for page in paginator.paginate():
+    # Only request the GPU families we track
+    pages = paginator.paginate(
+        Filters=[
+            {
+                "Name": "instance-type",
+                "Values": [f"{family}.*" for family in GPU_INSTANCE_FAMILIES],
+            }
+        ],
+        PaginationConfig={"PageSize": 100},
+    )
+
+    for page in pages:
         for instance_type in page["InstanceTypes"]:
-            # Filter for GPU instances only
-            if any(
-                instance_type["InstanceType"].startswith(family)
-                for family in GPU_INSTANCE_FAMILIES
-            ):
-                gpu_info = None
-                gpu_count = 0
-                gpu_model = None
-                gpu_memory = 0
-
-                # Extract GPU information
-                if "GpuInfo" in instance_type:
-                    gpu_info = instance_type["GpuInfo"]
-
-                    if "Gpus" in gpu_info:
-                        gpu_count_len = len(gpu_info["Gpus"])
-                        if gpu_count_len == 0:
-                            gpu_count = gpu_info["Gpus"][0].get("Count", 1)
-                            gpu_model = gpu_info["Gpus"][0].get("Name", "Unknown")
-                            gpu_memory = (
-                                gpu_info["Gpus"][0]
-                                .get("MemoryInfo", {})
-                                .get("SizeInMiB", 0)
-                            )  # / 1024  # Convert to GB
-
-                # If GPU info not available from API, use our mapping
-                if not gpu_model or gpu_memory == 0:
-                    for family, model in GPU_MODEL_MAP.items():
-                        if instance_type["InstanceType"].startswith(family):
-                            gpu_model = model
-                            gpu_memory = GPU_MEMORY_MAP.get(model, 0)
-                            break
-
-                # For GPU counts if not provided
-                if gpu_count == 0:
-                    # Simple heuristic based on instance size (not always accurate)
-                    instance_size = instance_type["InstanceType"].split(".")[-1]
-                    if "24xlarge" in instance_size:
-                        gpu_count = 8
-                    elif "16xlarge" in instance_size or "12xlarge" in instance_size:
-                        gpu_count = 4
-                    elif "8xlarge" in instance_size:
-                        gpu_count = 2
-                    elif "xlarge" in instance_size:
-                        gpu_count = 1
-
-                instance_data = {
-                    "instance_type": instance_type["InstanceType"],
-                    "family": next(
-                        (
-                            f
-                            for f in GPU_INSTANCE_FAMILIES
-                            if instance_type["InstanceType"].startswith(f)
-                        ),
-                        "unknown",
-                    ),
-                    "vcpus": instance_type.get("VCpuInfo", {}).get("DefaultVCpus", 0),
-                    "memory_gb": instance_type.get("MemoryInfo", {}).get("SizeInMiB", 0)
-                    / 1024,  # Convert to GB
-                    "gpu_count": gpu_count,
-                    "gpu_model": gpu_model,
-                    "gpu_memory_gb": gpu_memory,
-                    "total_gpu_memory_gb": gpu_count * gpu_memory,
-                }
-                instance_types.append(instance_data)
+            family = _family_for(instance_type["InstanceType"])
+            gpu_info = None
+            gpu_count = 0
+            gpu_model = None
+            gpu_memory = 0
+
+            # Extract GPU information
+            if "GpuInfo" in instance_type:
+                gpu_info = instance_type["GpuInfo"]
+
+                if "Gpus" in gpu_info:
+                    gpu_count_len = len(gpu_info["Gpus"])
+                    if gpu_count_len == 0:
+                        gpu_count = gpu_info["Gpus"][0].get("Count", 1)
+                        gpu_model = gpu_info["Gpus"][0].get("Name", "Unknown")
+                        gpu_memory = (
+                            gpu_info["Gpus"][0]
+                            .get("MemoryInfo", {})
+                            .get("SizeInMiB", 0)
+                        )  # / 1024  # Convert to GB
+
+            # If GPU info not available from API, use our mapping
+            if (not gpu_model or gpu_memory == 0) and family in FAMILY_TO_GPU:
+                gpu_model, gpu_memory = FAMILY_TO_GPU[family]
+
+            # For GPU counts if not provided
+            if gpu_count == 0:
+                # Simple heuristic based on instance size (not always accurate)
+                instance_size = instance_type["InstanceType"].split(".")[-1]
+                if "24xlarge" in instance_size:
+                    gpu_count = 8
+                elif "16xlarge" in instance_size or "12xlarge" in instance_size:
+                    gpu_count = 4
+                elif "8xlarge" in instance_size:
+                    gpu_count = 2
+                elif "xlarge" in instance_size:
+                    gpu_count = 1
+
+            instance_data = {
+                "instance_type": instance_type["InstanceType"],
+                "region": region,
+                "family": family,
+                "vcpus": instance_type.get("VCpuInfo", {}).get("DefaultVCpus", 0),
+                "memory_gb": instance_type.get("MemoryInfo", {}).get("SizeInMiB", 0)
+                / 1024,  # Convert to GB
+                "gpu_count": gpu_count,
+                "gpu_model": gpu_model,
+                "gpu_memory_gb": gpu_memory,
+                "total_gpu_memory_gb": gpu_count * gpu_memory,
+            }
+            instance_types.append(instance_data)
 
     return instance_types
 
 
-def get_instance_pricing(instance_types: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _parse_price(price_data: Dict[str, Any]) -> Optional[float]:
+    """
+    Extract the on-demand hourly USD price from a Pricing API price document.
+
+    Args:
+        price_data: Parsed ``PriceList`` entry
+
+    Returns:
+        Optional[float]: Hourly price in USD, or None if unavailable
+    """
+    terms = price_data.get("terms", {}).get("OnDemand", {})
+    if not terms:
+        return None
+
+    # Get the first pricing dimension
+    term_key = next(iter(terms))
+    price_dimensions = terms[term_key].get("priceDimensions", {})
+    dim_key = next(iter(price_dimensions), None)
+    if dim_key is None:
+        return None
+    price_per_unit = price_dimensions[dim_key].get("pricePerUnit", {})
+
+    if "USD" in price_per_unit:
+        return float(price_per_unit["USD"])
+    elif "CNY" in price_per_unit:
+        # Convert CNY to USD using approximate fixed rate
+        cny_to_usd_rate = 0.14  # This rate should be updated periodically
+        return float(price_per_unit["CNY"]) * cny_to_usd_rate
+    return None
+
+
+@cached(ttl=PRICING_CACHE_TTL, key=_pricing_cache_key)
+def get_region_prices(region: str = "us-east-1") -> Dict[str, Optional[float]]:
+    """
+    Get on-demand hourly prices for the compute instance types of a region.
+
+    All matching compute SKUs are fetched with a single paginated query and
+    indexed by instance type. API errors are left to propagate so that a
+    failed or partial listing is never cached.
+
+    Args:
+        region: AWS region to get prices for
+
+    Returns:
+        Dict[str, Optional[float]]: Hourly USD price by instance type
+    """
+    prices = {}
+
+    paginator = PRICING_CLIENT.get_paginator("get_products")
+    pages = paginator.paginate(
+        ServiceCode="AmazonEC2",
+        Filters=[
+            *_BASE_FILTERS,
+            {"Type": "TERM_MATCH", "Field": "regionCode", "Value": region},
+        ],
+    )
+
+    for page in pages:
+        for entry in page["PriceList"]:
+            price_data = _jloads(entry)
+            instance_type = (
+                price_data.get("product", {}).get("attributes", {}).get("instanceType")
+            )
+            # Keep the first SKU seen for each instance type
+            if instance_type and instance_type not in prices:
+                prices[instance_type] = _parse_price(price_data)
+
+    return prices
+
+
+def get_instance_pricing(
+    instance_types: List[Dict[str, Any]], region: str = "us-east-1"
+) -> List[Dict[str, Any]]:
     """
     Get pricing information for the provided instance types.
 
     Args:
         instance_types: List of instance type dictionaries
+        region: AWS region to get prices for
 
     Returns:
         List[Dict[str, Any]]: List of instance data with pricing
     """
-    pricing = boto3.client("pricing", region_name="us-east-1")
+    # API errors (including throttling that outlasts the adaptive retries
+    # configured in BOTO_CFG) fail the run; only instance types without a
+    # SKU are left unpriced
+    prices = get_region_prices(region)
 
     for instance in instance_types:
-        try:
-            response = pricing.get_products(
-                ServiceCode="AmazonEC2",
-                Filters=[
-                    {
-                        "Type": "TERM_MATCH",
-                        "Field": "instanceType",
-                        "Value": instance["instance_type"],
-                    },
-                    {
-                        "Type": "TERM_MATCH",
-                        "Field": "operatingSystem",
-                        "Value": "Linux",
-                    },
-                    {"Type": "TERM_MATCH", "Field": "tenancy", "Value": "Shared"},
-                    {"Type": "TERM_MATCH", "Field": "capacitystatus", "Value": "Used"},
-                    {"Type": "TERM_MATCH", "Field": "preInstalledSw", "Value": "NA"},
-                ],
-            )
-
-            if response["PriceList"]:
-                price_data = json.loads(response["PriceList"][0])
-                terms = price_data.get("terms", {}).get("OnDemand", {})
-                if terms:
-                    # Get the first pricing dimension
-                    term_key = next(iter(terms))
-                    price_dimensions = terms[term_key].get("priceDimensions", {})
-                    dim_key = next(iter(price_dimensions))
-                    price_per_unit = price_dimensions[dim_key].get("pricePerUnit", {})
-
-                    if "USD" in price_per_unit:
-                        instance["price_per_hour_usd"] = float(price_per_unit["USD"])
-                    elif "CNY" in price_per_unit:
-                        # Convert CNY to USD using approximate fixed rate
-                        cny_to_usd_rate = (
-                            0.14  # This rate should be updated periodically
-                        )
-                        instance["price_per_hour_usd"] = (
-                            float(price_per_unit["CNY"]) * cny_to_usd_rate
-                        )
-                    else:
-                        instance["price_per_hour_usd"] = None
-                else:
-                    instance["price_per_hour_usd"] = None
-            else:
-                instance["price_per_hour_usd"] = None
-
-        except Exception as e:
-            print(f"Error getting pricing for {instance['instance_type']}: {e}")
-            instance["price_per_hour_usd"] = None
+        instance["price_per_hour_usd"] = prices.get(instance["instance_type"])
 
     return instance_types
 
 
+def fetch_region(region: str) -> List[Dict[str, Any]]:
+    """
+    Get GPU instance types and their pricing for a single region.
+
+    Args:
+        region: AWS region name
+
+    Returns:
+        List[Dict[str, Any]]: List of instance data with pricing
+    """
+    instance_types = get_instance_types(region)
+    print(f"Found {len(instance_types)} GPU instance types in {region}")
+    return get_instance_pricing(instance_types, region)
+
+
+def fetch_all_regions(regions: List[str]) -> List[Dict[str, Any]]:
+    """
+    Get GPU instance types and pricing for several regions concurrently.
+
+    Args:
+        regions: AWS region names
+
+    Returns:
+        List[Dict[str, Any]]: Combined list of instance data with pricing
+    """
+    with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+        results = executor.map(fetch_region, regions)
+        return [
+            instance for region_instances in results for instance in region_instances
+        ]
+
+
 def calculate_derived_metrics(instances: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Calculate additional metrics for each instance.
 
+    Instances without pricing data are dropped.
+
     Args:
         instances: List of instance dictionaries
 
     Returns:
-        List[Dict[str, Any]]: Enhanced list with additional metrics
+        List[Dict[str, Any]]: Enhanced list of priced instances with additional metrics
     """
-    for instance in instances:
-        # Skip instances with no pricing data
-        if instance.get("price_per_hour_usd") is None:
-            del instance
-            continue
+    # Drop instances with no pricing data
+    instances = [i for i in instances if i.get("price_per_hour_usd") is not None]
 
+    for instance in instances:
         # Calculate price per GPU per hour
         if instance["gpu_count"] > 0:
             instance["price_per_gpu_hour"] = (
@@ -245,6 +441,21 @@ def calculate_derived_metrics(instances: List[Dict[str, Any]]) -> List[Dict[str,
     return instances
 
 
+def _dump_json(data: Dict[str, Any]) -> bytes:
+    """
+    Serialize data to indented JSON, using orjson when it is installed.
+
+    Args:
+        data: Data to serialize
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+
 def save_results(instances: List[Dict[str, Any]], filename: str = None):
     """
     Save the results to a JSON file.
@@ -264,35 +475,54 @@ def save_results(instances: List[Dict[str, Any]], filename: str = None):
 
     output_path = os.path.join(output_dir, filename)
 
-    with open(output_path, "w") as f:
-        json.dump(
-            {"generated_at": datetime.now().isoformat(), "instances": instances},
-            f,
-            indent=2,
-        )
+    # Serialize once; the static copy below reuses the written file
+    payload = _dump_json(
+        {"generated_at": datetime.now().isoformat(), "instances": instances}
+    )
+    with open(output_path, "wb") as f:
+        f.write(payload)
 
     print(f"Data saved to {output_path}")
 
-    # Also save a static copy for the application to use
+    # Also save a static copy for the application to use, hard-linked to the
+    # timestamped file where the filesystem allows it. The copy is built under
+    # a temporary name and moved into place atomically, so the app never sees
+    # the static file missing.
     static_path = os.path.join(output_dir, "aws_gpu_instances.json")
-    with open(static_path, "w") as f:
-        json.dump(
-            {"generated_at": datetime.now().isoformat(), "instances": instances},
-            f,
-            indent=2,
-        )
+    if static_path != output_path:
+        tmp_path = f"{static_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(output_path, tmp_path)
+        except OSError:
+            shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, static_path)
 
     print(f"Data also saved to {static_path}")
 
 
 def main():
     """Main function to execute the script."""
-    print("Fetching AWS GPU instance information...")
-    instance_types = get_instance_types()
-    print(f"Found {len(instance_types)} GPU instance types")
+    global USE_CACHE
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached API responses and refresh them",
+    )
+    parser.add_argument(
+        "--regions",
+        nargs="+",
+        default=DEFAULT_REGIONS,
+        help="AWS regions to fetch instance types and pricing for",
+    )
+    args = parser.parse_args()
+    USE_CACHE = not args.no_cache
 
-    print("Fetching pricing information...")
-    instances_with_pricing = get_instance_pricing(instance_types)
+    print("Fetching AWS GPU instance information and pricing...")
+    instances_with_pricing = fetch_all_regions(args.regions)
 
     print("Calculating additional metrics...")
     final_instances = calculate_derived_metrics(instances_with_pricing)
@@ -6,10 +6,23 @@ including NC, ND, NG, and NV families with various NVIDIA and AMD GPUs.
 """
 
 import os
+import shutil
 import json
+import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson parses large pricing documents several times faster than json
+_jloads = orjson.loads if orjson is not None else json.loads
 
 # Azure offers several GPU families as provided:
 # NC-family: Compute-intensive, Graphics-intensive, Visualization
@@ -20,6 +33,16 @@ from typing import Dict, List, Any, Optional
 # Azure pricing API endpoint
 AZURE_PRICING_API = "https://prices.azure.com/api/retail/prices"
 
+# Shared HTTP session so consecutive page requests reuse the same
+# keep-alive connection instead of repeating the TLS handshake
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=5, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+SESSION.headers["Accept-Encoding"] = "gzip"
+
 # GPU VM sizes we want to track by family
 GPU_VM_FAMILIES = {
     "NC": [
@@ -69,34 +92,75 @@ SERIES_GPU_MAP = {
     "NGads V620": {"model": "AMD V620", "count_suffix": {"8": 8, "4": 4, "2": 2, "1": 1}}
 }
 
-def get_azure_vm_pricing(filter_to_gpu=True) -> List[Dict[str, Any]]:
+# Single pattern matching any series name, longest first so that e.g.
+# "NCv3" wins over "NC"
+SERIES_REGEX = re.compile(
+    "(" + "|".join(re.escape(series) for series in sorted(SERIES_GPU_MAP, key=len, reverse=True)) + ")"
+)
+
+# VM size number following the family, e.g. "NC24" or "NCv3"
+_VM_SIZE_RE = re.compile(r"(?:NC|ND|NG|NV)[A-Za-z]*?(\d+)")
+
+def _fetch_page(params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Fetch a single page of results from Azure's pricing API.
+
+    Pages are decoded whole rather than streamed item by item: the next page
+    link follows the Items array, and the background prefetch needs it
+    before the items are processed.
+
+    Args:
+        params: Query parameters for the request
+
+    Returns:
+        Dict[str, Any]: Decoded JSON response
+    """
+    response = SESSION.get(AZURE_PRICING_API, params=params, timeout=(5, 30))
+    response.raise_for_status()
+    return _jloads(response.content)
+
+def _next_skiptoken(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract the skiptoken for the following page from a pricing API response.
+
+    Args:
+        data: Decoded JSON response
+
+    Returns:
+        Optional[str]: The skiptoken, or None if this is the last page
+    """
+    next_page = data.get('NextPageLink')
+    if not next_page or 'skiptoken' not in next_page:
+        return None
+
+    # Extract skiptoken from the nextPageLink
+    return next_page.split('skiptoken=')[1].split('&')[0]
+
+def stream_azure_vm_pricing(filter_to_gpu=True) -> Iterator[Dict[str, Any]]:
     """
     Fetch VM pricing information from Azure's pricing API.
 
+    Records are yielded page by page as they arrive instead of being
+    collected into a single list.
+
     Args:
         filter_to_gpu: Whether to filter to only GPU VMs
 
-    Returns:
-        List[Dict[str, Any]]: List of VM pricing data
+    Yields:
+        Dict[str, Any]: VM pricing record
     """
-    vm_data = []
-    next_page = None
+    record_count = 0
 
-    # Base filter for Linux VMs, pay-as-you-go
-    base_filter = "serviceName eq 'Virtual Machines' and priceType eq 'Consumption' and productName like '%Windows%' eq false"
+    # Base filter for regional pay-as-you-go VM prices. OData has no negated
+    # "like", so Windows SKUs are dropped in process_gpu_instances instead.
+    base_filter = "serviceName eq 'Virtual Machines' and priceType eq 'Consumption' and armRegionName ne 'global'"
 
     # Add GPU filter if requested
     if filter_to_gpu:
-        # Filter to VM families that have GPU capabilities
-        series_filters = []
-        for family, series_list in GPU_VM_FAMILIES.items():
-            for series in series_list:
-                # Convert series name to a pattern found in the API
-                # E.g. "NC-series" becomes filter for "NC "
-                api_pattern = series.replace("-series", " ").replace("series", "")
-                series_filters.append(f"contains(skuName, '{api_pattern}')")
-
-        family_filter = " or ".join(series_filters)
+        # Restrict to the GPU VM families server-side, e.g. Standard_NC24ads_A100_v4
+        family_filter = " or ".join(
+            f"startswith(armSkuName,'Standard_{family}')" for family in GPU_VM_FAMILIES
+        )
         api_filter = f"{base_filter} and ({family_filter})"
     else:
         api_filter = base_filter
@@ -104,49 +168,52 @@ def get_azure_vm_pricing(filter_to_gpu=True) -> List[Dict[str, Any]]:
     print(f"Using Azure API filter: {api_filter}")
 
     try:
-        # Paginate through results
-        while True:
-            params = {
-                "$filter": api_filter
-            }
-
-            if next_page:
-                params['$skiptoken'] = next_page
-
-            response = requests.get(AZURE_PRICING_API, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # Extract items from this page
-            items = data.get('Items', [])
-            vm_data.extend(items)
-
-            # Check for next page
-            next_page = data.get('NextPageLink')
-            if not next_page:
-                break
+        # Pages are chained through skiptokens, so each request depends on the
+        # previous response. Request the next page in the background as soon
+        # as its token is known so the fetch overlaps processing of the
+        # current page.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_fetch_page, {"$filter": api_filter})
+
+            while future is not None:
+                data = future.result()
+
+                # An invalid filter yields an empty first page rather than an error
+                if not record_count and not data.get('Items'):
+                    raise ValueError("Azure API filter matched no items")
+
+                # Check for next page
+                next_page = _next_skiptoken(data)
+                if next_page:
+                    future = executor.submit(
+                        _fetch_page, {"$filter": api_filter, "$skiptoken": next_page}
+                    )
+                else:
+                    future = None
 
-            # Extract skiptoken from the nextPageLink
-            if 'skiptoken' in next_page:
-                next_page = next_page.split('skiptoken=')[1].split('&')[0]
-            else:
-                break
+                # Extract items from this page
+                items = data.get('Items', [])
+                record_count += len(items)
+                yield from items
 
+    except ValueError:
+        # A filter matching nothing (or an undecodable page) must fail the
+        # run rather than be mistaken for an empty catalog
+        raise
     except Exception as e:
         print(f"Error fetching Azure pricing data: {e}")
 
-    print(f"Retrieved {len(vm_data)} VM pricing records from Azure")
-    return vm_data
+    print(f"Retrieved {record_count} VM pricing records from Azure")
 
-def process_gpu_instances(vm_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _classify_records(vm_data: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Process the Azure pricing data to extract GPU instance information.
+    Extract GPU instance information from Azure pricing records.
 
     Args:
-        vm_data: Raw pricing data from Azure API
+        vm_data: Raw pricing records from Azure API
 
     Returns:
-        List[Dict[str, Any]]: Processed GPU instance data
+        List[Dict[str, Any]]: Processed GPU instance data, unsorted
     """
     gpu_instances = []
 
@@ -159,59 +226,42 @@ def process_gpu_instances(vm_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]
         sku_name = vm.get('skuName', '')
         product_name = vm.get('productName', '')
 
-        # Skip non-GPU VMs
-        if not any(family in sku_name for family in ['NC', 'ND', 'NG', 'NV']):
+        # Skip Windows pricing, we only track Linux VMs
+        if 'windows' in product_name.lower():
             continue
 
-        # Check if this VM has GPU
-        has_gpu = False
-        gpu_model = None
-        gpu_count = 0
-        gpu_memory_gb = 0
-
-        # Find which GPU series this VM belongs to
-        for series_prefix, gpu_info in SERIES_GPU_MAP.items():
-            if series_prefix in product_name or series_prefix in sku_name:
-                has_gpu = True
-                gpu_model = gpu_info['model']
-                gpu_memory_gb = GPU_MODELS.get(gpu_model, 0)
-
-                # Determine GPU count based on the size suffix
-                # Extract the VM size from the name (e.g., "Standard_NC24" -> "24")
-                size_suffix = None
-                for suffix in gpu_info['count_suffix'].keys():
-                    if suffix in sku_name.split('_')[-1]:
-                        size_suffix = suffix
-                        break
-
-                if size_suffix:
-                    gpu_count = gpu_info['count_suffix'].get(size_suffix, 1)
-                else:
-                    # Default to 1 if we can't determine
-                    gpu_count = 1
+        # Find which GPU series this VM belongs to; VMs outside the known
+        # GPU series are skipped
+        match = SERIES_REGEX.search(product_name) or SERIES_REGEX.search(sku_name)
+        if not match:
+            continue
 
+        gpu_info = SERIES_GPU_MAP[match.group(1)]
+        gpu_model = gpu_info['model']
+        gpu_memory_gb = GPU_MODELS.get(gpu_model, 0)
+
+        # Determine GPU count based on the size suffix
+        # Extract the VM size from the name (e.g., "Standard_NC24" -> "24")
+        size_suffix = None
+        for suffix in gpu_info['count_suffix'].keys():
+            if suffix in sku_name.split('_')[-1]:
+                size_suffix = suffix
                 break
 
-        if not has_gpu:
-            continue
+        if size_suffix:
+            gpu_count = gpu_info['count_suffix'].get(size_suffix, 1)
+        else:
+            # Default to 1 if we can't determine
+            gpu_count = 1
 
         # Extract CPU and memory info from the description
-        vcpus = 0
         memory_gb = 0
         description = vm.get('productName', '')
 
-        # Example: "Virtual Machines NC24 v3 Series" - look for numbers
-        parts = description.split()
-        for part in parts:
-            # Extract VM size number, which often correlates with vCPU count
-            if any(s in part for s in ['NC', 'ND', 'NG', 'NV']) and any(c.isdigit() for c in part):
-                try:
-                    # Extract digits from the VM size
-                    digits = ''.join(c for c in part if c.isdigit())
-                    if digits:
-                        vcpus = int(digits)
-                except ValueError:
-                    pass
+        # Example: "Virtual Machines NC24 v3 Series" - the VM size number
+        # often correlates with vCPU count
+        size_match = _VM_SIZE_RE.search(description)
+        vcpus = int(size_match.group(1)) if size_match else 0
 
         # Azure typically has 4-8GB of RAM per vCPU for GPU VMs
         # This is a heuristic as the API doesn't provide this directly
@@ -246,11 +296,44 @@ def process_gpu_instances(vm_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]
 
         gpu_instances.append(instance)
 
+    return gpu_instances
+
+def process_gpu_instances(vm_data: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Process the Azure pricing data to extract GPU instance information.
+
+    Records are classified in process as they are streamed. Worker
+    processes were measured to be slower: pickling a record to a worker
+    costs about as much as classifying it.
+
+    Args:
+        vm_data: Raw pricing records from Azure API, e.g. as streamed by
+            stream_azure_vm_pricing
+
+    Returns:
+        List[Dict[str, Any]]: Processed GPU instance data
+    """
+    gpu_instances = _classify_records(vm_data)
+
     # Sort by GPU model and price
     gpu_instances.sort(key=lambda x: (x.get('gpu_model', ''), x.get('price_per_hour', 0)))
 
     return gpu_instances
 
+def _dump_json(data: Dict[str, Any]) -> bytes:
+    """
+    Serialize data to indented JSON, using orjson when it is installed.
+
+    Args:
+        data: Data to serialize
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
 def save_results(instances: List[Dict[str, Any]], filename: str = None):
     """
     Save the results to a JSON file.
@@ -268,28 +351,37 @@ def save_results(instances: List[Dict[str, Any]], filename: str = None):
 
     output_path = os.path.join(output_dir, filename)
 
-    with open(output_path, 'w') as f:
-        json.dump({
-            "generated_at": datetime.now().isoformat(),
-            "instances": instances
-        }, f, indent=2)
+    # Serialize once; the static copy below reuses the written file
+    payload = _dump_json({
+        "generated_at": datetime.now().isoformat(),
+        "instances": instances
+    })
+    with open(output_path, 'wb') as f:
+        f.write(payload)
 
     print(f"Data saved to {output_path}")
 
-    # Also save a static copy for the application to use
+    # Also save a static copy for the application to use, hard-linked to the
+    # timestamped file where the filesystem allows it. The copy is built under
+    # a temporary name and moved into place atomically, so the app never sees
+    # the static file missing.
     static_path = os.path.join(output_dir, "azure_gpu_instances.json")
-    with open(static_path, 'w') as f:
-        json.dump({
-            "generated_at": datetime.now().isoformat(),
-            "instances": instances
-        }, f, indent=2)
+    if static_path != output_path:
+        tmp_path = f"{static_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(output_path, tmp_path)
+        except OSError:
+            shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, static_path)
 
     print(f"Data also saved to {static_path}")
 
 def main():
     """Main function to execute the script."""
     print("Fetching Azure GPU instance information...")
-    vm_pricing_data = get_azure_vm_pricing(filter_to_gpu=True)
+    vm_pricing_data = stream_azure_vm_pricing(filter_to_gpu=True)
 
     print("Processing GPU instances...")
     gpu_instances = process_gpu_instances(vm_pricing_data)
@@ -5,15 +5,75 @@ This script retrieves information about GCP instances with GPUs,
 including A3, A2, G2, H3 and other families with various NVIDIA GPUs.
 """
 
+import argparse
+import hashlib
 import os
+import shutil
+import sys
 import json
+import msgspec
+import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # GCP pricing API endpoint
 GCP_PRICING_API = "https://cloudbilling.googleapis.com/v1/services/6F81-5844-456A/skus"
 
+# Maximum number of SKUs returned per page by the pricing API
+PAGE_SIZE = 5000
+
+# On-disk cache for SKU pages, kept out of public/ so it is never bundled
+# with the site
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "llm_memory_calculator")
+
+# Set to False (e.g. via --no-cache) to ignore cached pages and refresh them
+USE_CACHE = True
+
+class Category(msgspec.Struct):
+    """SKU category; only the fields used for filtering are decoded."""
+    resourceFamily: str = ''
+    serviceDisplayName: str = ''
+
+class UnitPrice(msgspec.Struct):
+    """Price of one unit; the API encodes units (int64) as a string."""
+    units: str = '0'
+    nanos: int = 0
+
+class TieredRate(msgspec.Struct):
+    """A single pricing tier."""
+    unitPrice: Optional[UnitPrice] = None
+
+class PricingExpression(msgspec.Struct):
+    """Pricing tiers of a SKU."""
+    tieredRates: List[TieredRate] = []
+
+class PricingInfo(msgspec.Struct):
+    """Pricing information of a SKU."""
+    pricingExpression: Optional[PricingExpression] = None
+
+class Sku(msgspec.Struct):
+    """A Compute Engine SKU from the pricing API. Unused fields are skipped."""
+    description: str = ''
+    category: Category = msgspec.field(default_factory=Category)
+    pricingInfo: List[PricingInfo] = []
+    serviceRegions: List[str] = []
+
+class SkuPage(msgspec.Struct):
+    """A page of SKUs from the pricing API."""
+    skus: List[Sku] = []
+    nextPageToken: str = ''
+
+# Decodes pricing API pages straight into typed structs without building
+# intermediate dicts
+_page_decoder = msgspec.json.Decoder(SkuPage)
+
 # GPU instance machine type prefixes
 GPU_MACHINE_TYPE_PREFIXES = [
     "a3-", "a2-", "g2-", "n1-", "n2-", "n2d-", "c2-", "c2d-", "h3-"
@@ -32,7 +92,23 @@ GPU_MODELS = {
     "nvidia-k80": {"name": "NVIDIA K80", "memory_gb": 12},
 }
 
-# Machine series to GPU mapping (default configurations)
+# Upper-cased GPU keys and names, precomputed for matching SKU descriptions.
+# Keys are interned as they make up the attachment index keys.
+GPU_KEYS_UPPER = [(sys.intern(key), key.upper(), gpu['name'].upper()) for key, gpu in GPU_MODELS.items()]
+
+# Matches any of the machine type prefixes in a lower-cased description
+MACHINE_TYPE_PREFIX_RE = re.compile("|".join(re.escape(prefix) for prefix in GPU_MACHINE_TYPE_PREFIXES))
+
+# vCPU count, memory size and GPU count as they appear in SKU descriptions,
+# e.g. "96 vCPUs", "1360 GB", "8 GPUs". Numbers must start a word so that
+# digits inside model names such as "A100" or "nvidia-a100-40gb" never match.
+PARSE_RE = re.compile(
+    r'(?<!\S)(?:(?P<vcpu>\d+)\s*vCPUs?|(?P<mem>\d+(?:\.\d+)?)\s*GB|(?P<gpu>\d+)\s*GPUs?)\b',
+    re.IGNORECASE
+)
+
+# Machine series to GPU mapping (default configurations), keyed by the
+# two-character series name
 MACHINE_GPU_MAP = {
     "a3": {"model": "nvidia-h100-80gb", "default_count": 8},
     "a2": {"model": "nvidia-a100", "default_count": 4},  # Can be 40GB or 80GB
@@ -40,27 +116,267 @@ MACHINE_GPU_MAP = {
     "h3": {"model": "nvidia-h100-80gb", "default_count": 8},
 }
 
-def get_compute_engine_products() -> List[Dict[str, Any]]:
+def _fetch_page(session: requests.Session, page_token: Optional[str] = None) -> SkuPage:
+    """
+    Fetch a single page of SKUs from the pricing API.
+
+    Args:
+        session: HTTP session to issue the request on
+        page_token: Token of the page to fetch, None for the first page
+
+    Returns:
+        SkuPage: Decoded page
+    """
+    params = {'pageSize': PAGE_SIZE}
+    if page_token:
+        params['pageToken'] = page_token
+
+    # Pages are cached on disk along with their ETag; a revalidation that
+    # comes back 304 Not Modified reuses the cached body
+    page_key = hashlib.sha1((page_token or '').encode()).hexdigest()[:16]
+    cache_path = os.path.join(CACHE_DIR, f"gcp_skus_{page_key}.json")
+    etag_path = f"{cache_path}.etag"
+
+    headers = {}
+    if USE_CACHE and os.path.exists(cache_path) and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            headers['If-None-Match'] = f.read()
+
+    response = session.get(GCP_PRICING_API, params=params, headers=headers, timeout=30)
+
+    if response.status_code == 304:
+        with open(cache_path, 'rb') as f:
+            return _page_decoder.decode(f.read())
+
+    response.raise_for_status()
+
+    etag = response.headers.get('ETag')
+    if etag:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for path, content, mode in ((cache_path, response.content, 'wb'), (etag_path, etag, 'w')):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+    return _page_decoder.decode(response.content)
+
+def get_compute_engine_products() -> List[Sku]:
     """
     Retrieve GCP Compute Engine product data from the pricing API.
 
     Returns:
-        List[Dict[str, Any]]: List of product data
+        List[Sku]: List of product data
     """
+    skus = []
+
     try:
-        # Using the public pricing API
-        response = requests.get(GCP_PRICING_API)
-        response.raise_for_status()
-        data = response.json()
-        return data.get('skus', [])
+        # Using the public pricing API. Pages are chained through
+        # nextPageToken, so the next page is requested in the background as
+        # soon as its token is known, overlapping the fetch with processing
+        # of the current page.
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_fetch_page, session)
+
+            while future is not None:
+                data = future.result()
+
+                next_page = data.nextPageToken
+                future = executor.submit(_fetch_page, session, next_page) if next_page else None
+
+                skus.extend(data.skus)
     except Exception as e:
         print(f"Error fetching GCP pricing data: {e}")
         return []
 
-def filter_gpu_instances(skus: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return skus
+
+def _first_price(sku: Sku) -> Optional[float]:
+    """
+    Get the first non-zero unit price of a SKU.
+
+    Args:
+        sku: SKU data from the pricing API
+
+    Returns:
+        Optional[float]: Price in USD, or None if the SKU has no non-zero rate
+    """
+    for tier in sku.pricingInfo:
+        if tier.pricingExpression is None:
+            continue
+        for rate in tier.pricingExpression.tieredRates:
+            if rate.unitPrice is None:
+                continue
+            units = int(rate.unitPrice.units)
+            nanos = rate.unitPrice.nanos
+            if units or nanos:
+                return units + nanos / 1_000_000_000
+    return None
+
+def parse_gpu_sku(sku: Sku) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Parse a SKU describing a GPU accelerator attachment.
+
+    Args:
+        sku: Compute SKU data from the pricing API
+
+    Returns:
+        Optional[Tuple[str, Dict[str, Any]]]: The GPU type and its attachment
+        details, or None if the SKU is not a known GPU accelerator
+    """
+    # Check if it's a GPU accelerator
+    description = sku.description
+    if 'GPU' not in description or 'cost' not in description.lower():
+        return None
+
+    # Extract GPU type from description
+    description_upper = description.upper()
+    gpu_type = None
+    for gpu_key, key_upper, name_upper in GPU_KEYS_UPPER:
+        if key_upper in description_upper or name_upper in description_upper:
+            gpu_type = gpu_key
+            break
+
+    if not gpu_type:
+        return None
+
+    price = _first_price(sku)
+
+    return gpu_type, {
+        'price_per_hour': price,
+        'description': description,
+        'gpu_model': GPU_MODELS.get(gpu_type, {}).get('name', 'Unknown'),
+        'memory_gb': GPU_MODELS.get(gpu_type, {}).get('memory_gb', 0)
+    }
+
+def parse_vm_sku(sku: Sku) -> Optional[Tuple[Dict[str, Any], str, int]]:
+    """
+    Parse a SKU describing a VM machine type that comes with GPUs.
+
+    Args:
+        sku: Compute SKU data from the pricing API
+
+    Returns:
+        Optional[Tuple[Dict[str, Any], str, int]]: The instance details, the
+        GPU model key and the GPU count, or None if the SKU is not a GPU
+        machine type
+    """
+    # Only process Compute Engine VM instances
+    if sku.category.serviceDisplayName != 'Compute Engine':
+        return None
+
+    description = sku.description
+    description_lower = description.lower()
+
+    # Check if this is a machine type we're interested in
+    if not MACHINE_TYPE_PREFIX_RE.search(description_lower):
+        return None
+    machine_type = description
+
+    # Determine the GPU model and count based on machine type. Series names
+    # are all two characters, so the leading characters index the map directly.
+    machine_gpu = MACHINE_GPU_MAP.get(description_lower[:2])
+    if not machine_gpu:
+        return None
+
+    # Extract details from the machine type
+    instance_details = {
+        'machine_type': machine_type,
+        'description': description,
+        'regions': sku.serviceRegions,
+        'vcpus': 0,
+        'memory_gb': 0
+    }
+
+    # Try to extract CPU, memory and GPU count information from the description
+    described_gpu_count = None
+    for match in PARSE_RE.finditer(description):
+        if match['vcpu']:
+            instance_details['vcpus'] = int(match['vcpu'])
+        elif match['mem']:
+            instance_details['memory_gb'] = float(match['mem'])
+        else:
+            described_gpu_count = int(match['gpu'])
+
+    # Get pricing
+    price = _first_price(sku)
+
+    instance_details['price_per_hour'] = price
+
+    gpu_model = machine_gpu['model']
+    gpu_count = machine_gpu['default_count']
+
+    # Adjust count based on machine type size
+    if 'highgpu' in description_lower:
+        gpu_count = 8  # Typically high-GPU machines have 8 GPUs
+    elif 'standard' in description_lower:
+        gpu_count = 4  # Standard GPU count is often 4
+
+    # Prefer the GPU count from the description when present
+    if described_gpu_count is not None:
+        gpu_count = described_gpu_count
+
+    return instance_details, gpu_model, gpu_count
+
+def calculate_derived_metrics(instance: Dict[str, Any], total_price: float):
+    """
+    Add the total and per-GPU pricing metrics to an instance.
+
+    Args:
+        instance: Instance data, updated in place
+        total_price: Hourly price of the VM including its GPUs
+    """
+    instance['total_price_per_hour'] = total_price
+    if instance['gpu_count'] > 0:
+        instance['price_per_gpu_hour'] = total_price / instance['gpu_count']
+    if instance['total_gpu_memory_gb'] > 0:
+        instance['price_per_gpu_gb_hour'] = total_price / instance['total_gpu_memory_gb']
+
+def _scan_skus(
+    skus: List[Sku]
+) -> Tuple[Dict[Tuple[str, str], Dict[str, Any]], List[Tuple[Dict[str, Any], str, int]]]:
+    """
+    Bucket SKUs into GPU attachments and GPU machine types.
+
+    Args:
+        skus: List of SKU data from the pricing API
+
+    Returns:
+        Tuple: GPU attachment details keyed by (region, GPU type), and the
+        parsed machine type rows
+    """
+    gpu_attachments = {}
+    vm_rows = []
+
+    for sku in skus:
+        # GPU attachments and machine types are both Compute SKUs; skip the
+        # rest (the vast majority) before looking at their descriptions.
+        # The parsers below rely on this check.
+        if sku.category.resourceFamily != 'Compute':
+            continue
+
+        gpu_row = parse_gpu_sku(sku)
+        if gpu_row:
+            gpu_type, attachment = gpu_row
+
+            for region in sku.serviceRegions:
+                # Region names repeat across thousands of SKUs; share one copy
+                gpu_attachments[(sys.intern(region), gpu_type)] = attachment
+
+        vm_row = parse_vm_sku(sku)
+        if vm_row:
+            vm_rows.append(vm_row)
+
+    return gpu_attachments, vm_rows
+
+def filter_gpu_instances(skus: List[Sku]) -> List[Dict[str, Any]]:
     """
     Filter the SKUs to only include GPU-related instances.
 
+    SKUs are bucketed into GPU attachments and GPU machine types in a single
+    pass. The machine types are then joined against the attachments
+    available in each of their regions.
+
     Args:
         skus: List of SKU data from the pricing API
 
@@ -68,153 +384,47 @@ def filter_gpu_instances(skus: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         List[Dict[str, Any]]: Filtered list of GPU instance data
     """
     gpu_instances = []
-    gpu_attachments = {}
+    # GPU attachment details keyed by (region, GPU type)
+    gpu_attachments, vm_rows = _scan_skus(skus)
 
-    # First, find GPU accelerator attachments
-    for sku in skus:
-        category = sku.get('category', {}).get('resourceFamily', '')
-        service_tier = sku.get('category', {}).get('serviceDisplayName', '')
-
-        # Check if it's a GPU accelerator
-        if (category == 'Compute' and
-            'GPU' in sku.get('description', '') and
-            'cost' in sku.get('description', '').lower()):
-
-            # Extract GPU type from description
-            description = sku['description']
-            gpu_type = None
-            for gpu_key in GPU_MODELS.keys():
-                if gpu_key.upper() in description.upper() or GPU_MODELS[gpu_key]['name'].upper() in description.upper():
-                    gpu_type = gpu_key
-                    break
-
-            if gpu_type:
-                price = None
-                for tier in sku.get('pricingInfo', []):
-                    for p in tier.get('pricingExpression', {}).get('tieredRates', []):
-                        if p.get('unitPrice', {}).get('units', 0) > 0 or p.get('unitPrice', {}).get('nanos', 0) > 0:
-                            units = int(p.get('unitPrice', {}).get('units', 0))
-                            nanos = int(p.get('unitPrice', {}).get('nanos', 0)) / 1_000_000_000
-                            price = units + nanos
-                            break
-
-                regions = []
-                for geo_attribute in sku.get('serviceRegions', []):
-                    regions.append(geo_attribute)
-
-                for region in regions:
-                    gpu_attachments.setdefault(region, {})
-                    gpu_attachments[region][gpu_type] = {
-                        'price_per_hour': price,
-                        'price_per_hour_usd': price,  # Adding USD-specific field for consistency
-                        'description': description,
-                        'gpu_model': GPU_MODELS.get(gpu_type, {}).get('name', 'Unknown'),
-                        'memory_gb': GPU_MODELS.get(gpu_type, {}).get('memory_gb', 0)
-                    }
-
-    # Now find VM instances and match them with GPUs
-    for sku in skus:
-        category = sku.get('category', {}).get('resourceFamily', '')
-        service_tier = sku.get('category', {}).get('serviceDisplayName', '')
-
-        # Only process compute VM instances
-        if category == 'Compute' and service_tier == 'Compute Engine':
-            description = sku.get('description', '')
-
-            # Check if this is a machine type we're interested in
-            machine_type = None
-            for prefix in GPU_MACHINE_TYPE_PREFIXES:
-                if prefix in description.lower():
-                    machine_type = description
-                    break
-
-            if machine_type:
-                # Extract details from the machine type
-                instance_details = {
-                    'machine_type': machine_type,
-                    'description': description,
-                    'regions': sku.get('serviceRegions', []),
-                    'vcpus': 0,
-                    'memory_gb': 0
-                }
-
-                # Try to extract CPU and memory information from the description
-                parts = description.split()
-                for i, part in enumerate(parts):
-                    if part.lower() == 'vcpu' or part.lower() == 'vcpus':
-                        try:
-                            instance_details['vcpus'] = int(parts[i-1])
-                        except (ValueError, IndexError):
-                            pass
-                    if 'gb' in part.lower() and i > 0:
-                        try:
-                            instance_details['memory_gb'] = float(parts[i-1])
-                        except (ValueError, IndexError):
-                            pass
-
-                # Get pricing
-                price = None
-                for tier in sku.get('pricingInfo', []):
-                    for p in tier.get('pricingExpression', {}).get('tieredRates', []):
-                        if p.get('unitPrice', {}).get('units', 0) > 0 or p.get('unitPrice', {}).get('nanos', 0) > 0:
-                            units = int(p.get('unitPrice', {}).get('units', 0))
-                            nanos = int(p.get('unitPrice', {}).get('nanos', 0)) / 1_000_000_000
-                            price = units + nanos
-                            break
-
-                instance_details['price_per_hour'] = price
-                instance_details['price_per_hour_usd'] = price  # Adding USD-specific field for consistency
-
-                # Determine the GPU model and count based on machine type
-                machine_series = None
-                for series in MACHINE_GPU_MAP:
-                    if machine_type.lower().startswith(series):
-                        machine_series = series
-                        break
-
-                if machine_series:
-                    gpu_model = MACHINE_GPU_MAP[machine_series]['model']
-                    gpu_count = MACHINE_GPU_MAP[machine_series]['default_count']
-
-                    # Adjust count based on machine type size
-                    if 'highgpu' in machine_type.lower():
-                        gpu_count = 8  # Typically high-GPU machines have 8 GPUs
-                    elif 'standard' in machine_type.lower():
-                        gpu_count = 4  # Standard GPU count is often 4
-
-                    # Try to extract the GPU count from the description
-                    for i, part in enumerate(parts):
-                        if part.lower() == 'gpu' or part.lower() == 'gpus':
-                            try:
-                                gpu_count = int(parts[i-1])
-                            except (ValueError, IndexError):
-                                pass
-
-                    # Add GPU information
-                    for region in instance_details['regions']:
-                        if region in gpu_attachments and gpu_model in gpu_attachments[region]:
-                            instance_details['gpu_model'] = gpu_attachments[region][gpu_model]['gpu_model']
-                            instance_details['gpu_memory_gb'] = gpu_attachments[region][gpu_model]['memory_gb']
-                            instance_details['gpu_count'] = gpu_count
-                            instance_details['total_gpu_memory_gb'] = gpu_count * gpu_attachments[region][gpu_model]['memory_gb']
-                            # Add the GPU pricing to the instance pricing
-                            gpu_price = gpu_attachments[region][gpu_model]['price_per_hour'] * gpu_count
-                            if instance_details['price_per_hour']:
-                                # Only add if we have VM pricing data
-                                instance_details['total_price_per_hour'] = instance_details['price_per_hour'] + gpu_price
-                                instance_details['total_price_per_hour_usd'] = instance_details['total_price_per_hour']  # Adding USD-specific field
-                                # Calculate derived metrics
-                                instance_details['price_per_gpu_hour'] = instance_details['total_price_per_hour'] / gpu_count
-                                instance_details['price_per_gpu_hour_usd'] = instance_details['price_per_gpu_hour']  # Adding USD-specific field
-                                if instance_details['total_gpu_memory_gb'] > 0:
-                                    instance_details['price_per_gpu_gb_hour'] = (
-                                        instance_details['total_price_per_hour'] / instance_details['total_gpu_memory_gb']
-                                    )
-                                    instance_details['price_per_gpu_gb_hour_usd'] = instance_details['price_per_gpu_gb_hour']  # Adding USD-specific field
-                            gpu_instances.append(instance_details)
+    # Now match VM instances with the GPUs attachable in their regions. The
+    # instance is priced with the attachment of the last such region.
+    for instance_details, gpu_model, gpu_count in vm_rows:
+        attachment = None
+        for region in instance_details['regions']:
+            attachment = gpu_attachments.get((region, gpu_model), attachment)
+
+        if not attachment:
+            continue
+
+        instance_details['gpu_model'] = attachment['gpu_model']
+        instance_details['gpu_memory_gb'] = attachment['memory_gb']
+        instance_details['gpu_count'] = gpu_count
+        instance_details['total_gpu_memory_gb'] = gpu_count * attachment['memory_gb']
+
+        # Only add the GPU pricing if we have VM and GPU pricing data
+        if instance_details['price_per_hour'] and attachment['price_per_hour'] is not None:
+            gpu_price = attachment['price_per_hour'] * gpu_count
+            calculate_derived_metrics(instance_details, instance_details['price_per_hour'] + gpu_price)
+
+        gpu_instances.append(instance_details)
 
     return gpu_instances
 
+def _dump_json(data: Dict[str, Any]) -> bytes:
+    """
+    Serialize data to indented JSON, using orjson when it is installed.
+
+    Args:
+        data: Data to serialize
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
 def save_results(instances: List[Dict[str, Any]], filename: str = None):
     """
     Save the results to a JSON file.
@@ -232,26 +442,44 @@ def save_results(instances: List[Dict[str, Any]], filename: str = None):
 
     output_path = os.path.join(output_dir, filename)
 
-    with open(output_path, 'w') as f:
-        json.dump({
-            "generated_at": datetime.now().isoformat(),
-            "instances": instances
-        }, f, indent=2)
+    # Serialize once; the static copy below reuses the written file. Files
+    # are written under a temporary name and moved into place atomically so
+    # an interrupted run never leaves a truncated file behind.
+    payload = _dump_json({
+        "generated_at": datetime.now().isoformat(),
+        "instances": instances
+    })
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, output_path)
 
     print(f"Data saved to {output_path}")
 
-    # Also save a static copy for the application to use
+    # Also save a static copy for the application to use, hard-linked to the
+    # timestamped file where the filesystem allows it
     static_path = os.path.join(output_dir, "gcp_gpu_instances.json")
-    with open(static_path, 'w') as f:
-        json.dump({
-            "generated_at": datetime.now().isoformat(),
-            "instances": instances
-        }, f, indent=2)
+    if static_path != output_path:
+        tmp_path = f"{static_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(output_path, tmp_path)
+        except OSError:
+            shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, static_path)
 
     print(f"Data also saved to {static_path}")
 
 def main():
     """Main function to execute the script."""
+    global USE_CACHE
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached SKU pages and refresh them")
+    args = parser.parse_args()
+    USE_CACHE = not args.no_cache
+
     print("Fetching GCP GPU instance information...")
     products = get_compute_engine_products()
     print(f"Found {len(products)} GCP products")
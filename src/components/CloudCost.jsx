@@ -29,7 +29,11 @@ const CloudCost = ({ memoryRequired }) => {
                         id: 'gcp',
                         name: 'GCP',
                         label: 'Google Cloud Platform',
-                        instances: gcpData.instances
+                        // GCP prices are published in USD without the "_usd" suffix
+                        instances: gcpData.instances.map(instance => ({
+                            ...instance,
+                            price_per_hour_usd: instance.price_per_hour
+                        }))
                     }
                     // Add Azure when available
                 ];
@@ -408,12 +412,12 @@ const CloudCost = ({ memoryRequired }) => {
                                     const costColor = getCostColorClass(cost);
 
                                     return (
-                                        <div key={`${instance.providerId}-${instance.instance_type}`} className="flex justify-between items-center p-2 rounded bg-green-900/10">
+                                        <div key={`${instance.providerId}-${instance.region || ''}-${instance.instance_type}`} className="flex justify-between items-center p-2 rounded bg-green-900/10">
                                             <div className="flex items-center">
                                                 <span className="text-cyan-400 flex items-center">
                                                     {providerIcons[instance.providerId] || null}
                                                 </span>
-                                                <span className="font-medium text-white">{instance.provider}: {instance.instance_type}</span>
+                                                <span className="font-medium text-white">{instance.provider}: {instance.instance_type}{instance.region ? ` (${instance.region})` : ''}</span>
                                                 <span className="ml-1 text-xs text-gray-400">
                                                     ({instance.gpu_count}x {instance.gpu_model}, {instance.gpu_memory_gb} GB)
                                                 </span>
@@ -433,12 +437,12 @@ const CloudCost = ({ memoryRequired }) => {
                                     <div className="mt-3 pt-2 border-t border-gray-700">
                                         <p className="text-xs text-gray-400 mb-2">Instances with insufficient memory:</p>
                                         {incompatibleInstances.map((instance) => (
-                                            <div key={`${instance.providerId}-${instance.instance_type}`} className="flex justify-between items-center p-2 rounded bg-red-900/10">
+                                            <div key={`${instance.providerId}-${instance.region || ''}-${instance.instance_type}`} className="flex justify-between items-center p-2 rounded bg-red-900/10">
                                                 <div className="flex items-center">
                                                     <span className="text-gray-500 flex items-center">
                                                         {providerIcons[instance.providerId] || null}
                                                     </span>
-                                                    <span className="font-medium text-gray-400">{instance.provider}: {instance.instance_type}</span>
+                                                    <span className="font-medium text-gray-400">{instance.provider}: {instance.instance_type}{instance.region ? ` (${instance.region})` : ''}</span>
                                                     <span className="ml-1 text-xs text-gray-500">
                                                         ({instance.gpu_count}x {instance.gpu_model}, {instance.gpu_memory_gb} GB)
                                                     </span>